@@ -6,11 +6,47 @@
 # The robot's perception of each square is noisy; misidentifications
 # can reduce the achieved movement (robot stops before perceived wall).
 
+import os
 import random
-import collections
+import functools
 import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 import matplotlib.pyplot as plt
 
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # numba is optional; simulate() falls back to NumPy
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        def wrap(func):
+            return func
+        return wrap
+
+# square labels as ints; _LABELS maps them back to names for display
+WINDOW, WALL = 0, 1
+_LABELS = ("window", "wall")
+
+
+@njit(cache=True)
+def _simulate_nb(moves, cum, max_pos, n_steps, trials, seed):
+    # compiled Monte Carlo kernel: returns counts of final positions 0..max_pos.
+    # only movement is simulated, since sensing never changes the final position
+    np.random.seed(seed)
+    counts = np.zeros(max_pos + 1, dtype=np.int64)
+    for _ in range(trials):
+        pos = 0
+        for _ in range(n_steps):
+            m = moves[np.searchsorted(cum, np.random.random())]
+            pos = min(pos + m, max_pos)
+            if pos == max_pos:
+                # absorbing: moves are non-negative, so the robot stays put
+                break
+        counts[pos] += 1
+    return counts
+
 
 class RobotSimulator:
     def __init__(self,
@@ -22,11 +58,20 @@ class RobotSimulator:
         self.max_pos = max_pos
         # default move distribution: 0->10%, 1->70%, 2->20%
         self.move_probs = move_probs or {0:0.1, 1:0.7, 2:0.2}
+        _check_move_probs(self.move_probs)
         self.p_correct_wall = p_correct_wall
         self.p_correct_window = p_correct_window
         self.rng = rng or random.Random()
         # precompute cumulative distribution for sampling
         self._moves, self._cum = self._build_cdf(self.move_probs)
+        # array copies for the batched samplers (np.searchsorted on the CDF).
+        # the last CDF entry is pinned to 1.0 so rounding in the running sum
+        # can never push an index past the last move
+        self._moves_np = np.asarray(self._moves, dtype=np.int64)
+        self._cum_np = np.asarray(self._cum, dtype=np.float64)
+        self._cum_np[-1] = 1.0
+        # alias table for O(1) sampling, indexed like self._moves
+        self._alias_prob, self._alias_alias = self._build_alias(self.move_probs)
 
     def _build_cdf(self, probs_dict):
         moves = sorted(probs_dict)
@@ -37,83 +82,239 @@ class RobotSimulator:
             cum.append(s)
         return moves, cum
 
+    def _build_alias(self, probs_dict):
+        # Walker's alias method (Vose's construction) over the sorted moves
+        moves = sorted(probs_dict)
+        k = len(moves)
+        scaled = [probs_dict[m] * k for m in moves]
+        prob = [1.0] * k
+        alias = list(range(k))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        # whatever is left over is 1.0 up to rounding and keeps prob 1.0
+        return prob, alias
+
     def _sample_move(self):
-        u = self.rng.random()
-        for m, c in zip(self._moves, self._cum):
-            if u <= c:
-                return m
-        return self._moves[-1]
+        # one uniform does both jobs: the integer part picks a column and
+        # the fractional part chooses between it and its alias
+        x = self.rng.random() * len(self._moves)
+        i = int(x)
+        if x - i < self._alias_prob[i]:
+            return self._moves[i]
+        return self._moves[self._alias_alias[i]]
 
     @staticmethod
     def true_label_at(pos):
         # pos 0 == window, pos1 == wall, pos2 == window, etc.
-        return "window" if (pos % 2) == 0 else "wall"
+        # returns WINDOW (0) or WALL (1); _LABELS has the display names
+        return pos & 1
 
     def perceive_label(self, true_label):
         # returns perceived label given the true label and confusion probabilities
-        if true_label == "wall":
-            if self.rng.random() <= self.p_correct_wall:
-                return "wall"
-            else:
-                return "window"
-        else:
-            if self.rng.random() <= self.p_correct_window:
-                return "window"
-            else:
-                return "wall"
+        if true_label == WALL:
+            return WALL if self.rng.random() <= self.p_correct_wall else WINDOW
+        return WINDOW if self.rng.random() <= self.p_correct_window else WALL
 
     def run_single(self, n_steps, return_trace=False):
+        if return_trace:
+            return self._run_single_trace(n_steps)
+        return self._run_single_fast(n_steps)
+
+    def _run_single_fast(self, n_steps):
+        # movement only: perception never changes where the robot ends up,
+        # so without a trace the sensor model is skipped entirely
+        rand = self.rng.random
+        max_pos = self.max_pos
+        moves = self._moves
+        alias_prob = self._alias_prob
+        alias = self._alias_alias
+        k = len(moves)
+        pos = 0
+        for _ in range(n_steps):
+            x = rand() * k
+            i = int(x)
+            pos += moves[i] if x - i < alias_prob[i] else moves[alias[i]]
+            if pos >= max_pos:
+                # max_pos is absorbing (moves are non-negative), so the
+                # remaining steps cannot change the final position
+                return max_pos
+        return pos
+
+    def _run_single_trace(self, n_steps):
+        # hot loop: bind attributes to locals once and inline the bodies of
+        # _sample_move, true_label_at and perceive_label.
+        # labels are ints internally (0 == window, 1 == wall) and only
+        # turned into strings for the trace
+        rand = self.rng.random
+        max_pos = self.max_pos
+        moves = self._moves
+        alias_prob = self._alias_prob
+        alias = self._alias_alias
+        k = len(moves)
+        p_wall = self.p_correct_wall
+        p_win = self.p_correct_window
+        labels = _LABELS
         pos = 0
         trace = []
-        for step in range(n_steps):
-            intended = self._sample_move()
-            target = min(pos + intended, self.max_pos)
+        # draw uniforms inline: pre-drawing them into lists (or one NumPy
+        # array per trial) keeps the same RNG work and measured slower
+        for _ in range(n_steps):
+            x = rand() * k
+            i = int(x)
+            intended = moves[i] if x - i < alias_prob[i] else moves[alias[i]]
+            target = pos + intended
+            if target > max_pos:
+                target = max_pos
             # sense the label at the target position (for localization only)
             # walls/windows do not block movement
-            true = self.true_label_at(target)
-            perceived = self.perceive_label(true)
-            trace.append((target, true, perceived))
+            true = target & 1
+            if true:
+                perceived = 1 if rand() <= p_wall else 0
+            else:
+                perceived = 0 if rand() <= p_win else 1
+            trace.append((target, labels[true], labels[perceived]))
             pos = target
-        if return_trace:
-            return pos, trace
-        return pos
+        return pos, trace
 
-    def simulate(self, n_steps, trials=10000):
-        counts = collections.Counter()
+    def simulate_final_positions(self, n_steps, trials=10000):
+        """Pure-Python Monte Carlo over the move-only fast path, driven by
+        self.rng. Same result format as simulate(); useful as a reference
+        for the vectorized implementations.
+        """
+        # the state space is 0..max_pos, so a fixed-size list beats a Counter
+        counts = [0] * (self.max_pos+1)
+        run = self._run_single_fast
         for _ in range(trials):
-            final = self.run_single(n_steps)
-            counts[final] += 1
+            counts[run(n_steps)] += 1
         # convert to probabilities
         probs = {pos: counts[pos]/trials for pos in range(self.max_pos+1)}
         return probs
 
+    def _derive_seed(self):
+        # seed for the compiled/NumPy RNGs, drawn through .random() only so
+        # any rng that run_single accepts (random.Random, np.random.Generator,
+        # ...) works here too
+        return int(self.rng.random() * 2**32)
+
+    def _simulate_counts_np(self, n_steps, trials):
+        # vectorized over trials: draw every move up front, then walk all
+        # trials forward one column at a time (n_steps is small)
+        rng = np.random.default_rng(self._derive_seed())
+        idxs = np.searchsorted(self._cum_np, rng.random((trials, n_steps)))
+        moves = self._moves_np[idxs]
+        pos = np.zeros(trials, dtype=np.int64)
+        for t in range(n_steps):
+            pos = np.minimum(pos + moves[:, t], self.max_pos)
+            if pos.min() == self.max_pos:
+                # every trial has reached the absorbing state
+                break
+        return np.bincount(pos, minlength=self.max_pos+1)
+
+    def simulate(self, n_steps, trials=10000):
+        # the compiled/NumPy RNGs are seeded from self.rng so a seeded
+        # random.Random still gives reproducible results
+        if HAVE_NUMBA:
+            counts = _simulate_nb(self._moves_np, self._cum_np,
+                                  self.max_pos, n_steps, trials,
+                                  self._derive_seed())
+        else:
+            counts = self._simulate_counts_np(n_steps, trials)
+        # convert to probabilities
+        probs = {p: float(counts[p])/trials for p in range(self.max_pos+1)}
+        return probs
+
     def compute_exact_posterior(self, n_steps):
         """Compute the exact distribution over final positions after n_steps
-        using dynamic programming and the model's stochastic transitions.
+        by raising the (time-homogeneous) transition matrix to the n_steps power.
+        Results are memoized on (move_probs, n_steps, max_pos).
         Returns a dict {pos: probability} for pos in 0..max_pos.
+        Raises ValueError if n_steps is negative.
         """
-        # Build transition probabilities T[pos][next_pos]
-        # Robot moves from pos by sampling move distance m, arriving at min(pos + m, max_pos)
-        # Sensor reading (wall/window) at target position does not affect movement
-        T = {pos: {s: 0.0 for s in range(self.max_pos+1)} for pos in range(self.max_pos+1)}
-        for pos in range(self.max_pos+1):
-            for m, pm in self.move_probs.items():
-                target = min(pos + m, self.max_pos)
-                T[pos][target] += pm
-
-        # dynamic programming over time steps
-        dist = [0.0] * (self.max_pos+1)
-        dist[0] = 1.0
-        for _ in range(n_steps):
-            new = [0.0] * (self.max_pos+1)
-            for pos in range(self.max_pos+1):
-                if dist[pos] == 0.0:
-                    continue
-                for s in range(self.max_pos+1):
-                    new[s] += dist[pos] * T[pos][s]
-            dist = new
+        result = _exact_dp(tuple(sorted(self.move_probs.items())), n_steps, self.max_pos)
+        return {pos: result[pos] for pos in range(self.max_pos+1)}
+
+    @staticmethod
+    def compute_exact_posterior_batch(move_probs_list, n_steps, max_pos=3):
+        """Exact final-position distributions for several move tables at once.
+        The transition matrices are stacked into a (B, S, S) array and raised
+        to the n_steps power by repeated squaring with batched matmuls.
+        Returns a (B, S) array; row b is the distribution for move_probs_list[b].
+        Raises ValueError if n_steps is negative or a move table is invalid.
+        """
+        _check_n_steps(n_steps)
+        for mp in move_probs_list:
+            _check_move_probs(mp)
+        T = np.stack([_transition_matrix(tuple(sorted(mp.items())), max_pos)
+                      for mp in move_probs_list])
+        B, S, _ = T.shape
+        P = np.broadcast_to(np.eye(S), (B, S, S))
+        base = T
+        k = n_steps
+        while k:
+            if k & 1:
+                P = P @ base
+            base = base @ base
+            k >>= 1
+        # the robot starts at position 0, so the answer is row 0 of T^n
+        return np.array(P[:, 0, :])
+
+
+@functools.lru_cache(maxsize=256)
+def _transition_matrix(move_probs_items, max_pos):
+    # Build transition matrix T[pos, next_pos] for a hashable move table.
+    # Robot moves from pos by sampling move distance m, arriving at min(pos + m, max_pos)
+    # Sensor reading (wall/window) at target position does not affect movement
+    S = max_pos+1
+    T = np.zeros((S, S))
+    pos = np.arange(S)
+    for m, pm in move_probs_items:
+        # all rows for this move at once; each row gets exactly one target,
+        # so plain fancy-index += is safe. moves that clip onto max_pos add
+        # into the same cell across iterations of this loop
+        T[pos, np.minimum(pos + m, max_pos)] += pm
+    # the cached array is shared between callers
+    T.flags.writeable = False
+    return T
+
+
+def _check_move_probs(move_probs):
+    # every sampler (alias table, CDF, exact solvers) assumes a proper
+    # distribution, so reject tables they would each treat differently.
+    # the comparisons are written so that NaN fails them
+    if not all(m >= 0 for m in move_probs):
+        # the absorbing-state early exits and np.bincount rely on this
+        raise ValueError(f"move distances must be non-negative: {move_probs}")
+    if not all(p >= 0 for p in move_probs.values()):
+        raise ValueError(f"move probabilities must be non-negative: {move_probs}")
+    if not abs(sum(move_probs.values()) - 1.0) <= 1e-9:
+        raise ValueError(f"move probabilities must sum to 1: {move_probs}")
+
+
+def _check_n_steps(n_steps):
+    # matrix_power would invert T for negative powers, which is meaningless here
+    if n_steps < 0:
+        raise ValueError(f"n_steps must be non-negative, got {n_steps}")
+
 
-        return {pos: dist[pos] for pos in range(self.max_pos+1)}
+@functools.lru_cache(maxsize=256)
+def _exact_dp(move_probs_items, n_steps, max_pos):
+    # returns a tuple so cached results cannot be mutated by callers
+    _check_n_steps(n_steps)
+    T = _transition_matrix(move_probs_items, max_pos)
+    dist = np.zeros(max_pos+1)
+    dist[0] = 1.0
+    result = dist @ np.linalg.matrix_power(T, n_steps)
+    return tuple(float(p) for p in result)
 
 
 def plot_distribution(probs, n_steps, trials, move_probs=None, out_file=None):
@@ -150,7 +351,27 @@ def plot_distribution(probs, n_steps, trials, move_probs=None, out_file=None):
         plt.show()
 
 
-def compare_distributions(move_probs_list, n_steps, trials=10000, use_exact=False):
+def _run_one(idx, dist_config, n_steps, trials, seed=None):
+    """Simulate one entry of compare_distributions; kept at module level so
+    it can be shipped to worker processes. Returns (idx, probs, move_probs).
+    """
+    move_probs = dist_config["movement"]
+    p_correct_wall = dist_config.get("p_correct_wall", 1.0)
+    p_correct_window = dist_config.get("p_correct_window", 1.0)
+
+    # offset the seed per distribution so workers draw independent streams
+    rng = random.Random(seed + idx) if seed is not None else None
+    sim = RobotSimulator(move_probs=move_probs,
+                         p_correct_wall=p_correct_wall,
+                         p_correct_window=p_correct_window,
+                         rng=rng)
+
+    probs = sim.simulate(n_steps, trials=trials)
+    return idx, probs, move_probs
+
+
+def compare_distributions(move_probs_list, n_steps, trials=10000, use_exact=False, seed=None,
+                          parallel=False):
     """Compare empirical or exact distributions across multiple movement probability sets.
     
     Args:
@@ -158,45 +379,56 @@ def compare_distributions(move_probs_list, n_steps, trials=10000, use_exact=Fals
         n_steps: Number of time steps to simulate
         trials: Number of simulation trials (ignored if use_exact=True)
         use_exact: If True, compute exact posteriors; if False, run simulations
+        seed: Optional base RNG seed; distribution idx uses seed + idx
+        parallel: If True, run the simulations in a process pool. Only pays off
+            for very large trials * n_steps; simulate() is already vectorized
+            and pool start-up dominates ordinary workloads
     """
     num_dists = len(move_probs_list)
-    fig, axes = plt.subplots(2, num_dists, figsize=(4*num_dists, 7))
+
+    results = [None] * num_dists
+    if use_exact:
+        # a single batched solve covers every distribution
+        movements = [dist_config["movement"] for dist_config in move_probs_list]
+        batch = RobotSimulator.compute_exact_posterior_batch(movements, n_steps)
+        for idx, (row, move_probs) in enumerate(zip(batch, movements)):
+            results[idx] = ({pos: float(p) for pos, p in enumerate(row)}, move_probs)
+    elif not parallel:
+        for idx, dist_config in enumerate(move_probs_list):
+            _, probs, move_probs = _run_one(idx, dist_config, n_steps, trials, seed)
+            results[idx] = (probs, move_probs)
+    else:
+        # each simulation is independent, so run them in worker processes
+        # and keep all plotting on the main process
+        max_workers = min(num_dists, os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(_run_one, idx, dist_config, n_steps, trials, seed)
+                       for idx, dist_config in enumerate(move_probs_list)]
+            for fut in as_completed(futures):
+                idx, probs, move_probs = fut.result()
+                results[idx] = (probs, move_probs)
+
+    # draw phase: every subplot shares the 0..1 probability axis
+    title_suffix = "exact" if use_exact else f"empirical ({trials} trials)"
+    fig, axes = plt.subplots(2, num_dists, figsize=(4*num_dists, 7),
+                             sharey=True, squeeze=False)
     
-    for idx, dist_config in enumerate(move_probs_list):
-        move_probs = dist_config["movement"]
-        p_correct_wall = dist_config.get("p_correct_wall", 1.0)
-        p_correct_window = dist_config.get("p_correct_window", 1.0)
-        
-        sim = RobotSimulator(move_probs=move_probs, 
-                           p_correct_wall=p_correct_wall,
-                           p_correct_window=p_correct_window)
-        
-        if use_exact:
-            probs = sim.compute_exact_posterior(n_steps)
-            title_suffix = "exact"
-        else:
-            probs = sim.simulate(n_steps, trials=trials)
-            title_suffix = f"empirical ({trials} trials)"
-        
-        positions = sorted(probs.keys())
+    for idx, (probs, move_probs) in enumerate(results):
+        positions = sorted(probs)
         values = [probs[p] for p in positions]
+        move_distances = sorted(move_probs)
+        move_values = [move_probs[d] for d in move_distances]
         
         # Top row: input movement distribution (blue)
-        move_distances = sorted(move_probs.keys())
-        move_values = [move_probs[d] for d in move_distances]
         axes[0, idx].bar(move_distances, move_values, tick_label=move_distances, color='steelblue')
-        axes[0, idx].set_xlabel('Movement distance')
-        axes[0, idx].set_ylabel('Probability')
-        axes[0, idx].set_title(f"Dist {idx+1} Input Distribution")
-        axes[0, idx].set_ylim(0, 1)
+        axes[0, idx].set(xlabel='Movement distance', ylabel='Probability',
+                         title=f"Dist {idx+1} Input Distribution", ylim=(0, 1))
         axes[0, idx].grid(axis='y', alpha=0.25)
         
         # Bottom row: final position distribution (orange)
         axes[1, idx].bar(positions, values, tick_label=positions, color='coral')
-        axes[1, idx].set_xlabel('Final position')
-        axes[1, idx].set_ylabel('Probability')
-        axes[1, idx].set_title(f"Dist {idx+1} Final Positions ({title_suffix})")
-        axes[1, idx].set_ylim(0, 1)
+        axes[1, idx].set(xlabel='Final position', ylabel='Probability',
+                         title=f"Dist {idx+1} Final Positions ({title_suffix})", ylim=(0, 1))
         axes[1, idx].grid(axis='y', alpha=0.25)
     
     plt.tight_layout()
@@ -211,12 +443,15 @@ def main():
     parser.add_argument('--save', type=str, default=None, help='Optional output PNG filename')
     parser.add_argument('--compare', action='store_true', help='Compare all 6 distributions from movement_table')
     parser.add_argument('--exact', action='store_true', help='Use exact posteriors instead of simulation')
+    parser.add_argument('--parallel', action='store_true',
+                        help='Run --compare simulations in a process pool (large workloads only)')
     args = parser.parse_args()
 
     if args.compare:
         # Import movement distributions from movement_table
         from movement_table import distribution_sets
-        compare_distributions(distribution_sets, args.steps, trials=args.trials, use_exact=args.exact)
+        compare_distributions(distribution_sets, args.steps, trials=args.trials,
+                              use_exact=args.exact, seed=args.seed, parallel=args.parallel)
     else:
         sim = RobotSimulator(rng=random.Random(args.seed))
         probs = sim.simulate(args.steps, trials=args.trials)
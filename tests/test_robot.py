@@ -1,11 +1,21 @@
 import pytest
 import types
 import copy
+import random
 
-from robot_sim import RobotSimulator, compare_distributions
+import robot_sim
+from robot_sim import RobotSimulator, compare_distributions, WINDOW, WALL
 import movement_table
 import matplotlib.pyplot as plt
 
+# every Monte Carlo entry point: (HAVE_NUMBA override, method name)
+SIMULATE_VARIANTS = [
+    pytest.param(True, "simulate", id="numba",
+                 marks=pytest.mark.skipif(not robot_sim.HAVE_NUMBA, reason="numba not installed")),
+    pytest.param(False, "simulate", id="numpy"),
+    pytest.param(None, "simulate_final_positions", id="python"),
+]
+
 
 def test_build_cdf_and_sample_move_deterministic():
     rng = random = __import__("random").Random(0)
@@ -58,3 +68,163 @@ def test_compare_distributions_functional(monkeypatch):
     compare_distributions(movement_table.distribution_sets, n_steps=3, trials=10, use_exact=True)
     # If it returns without raising, consider the functional test passed
 
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_compare_distributions_empirical_functional(monkeypatch, parallel):
+    monkeypatch.setattr(plt, "show", lambda: None)
+    # empirical path, both serial and through the process pool
+    compare_distributions(movement_table.distribution_sets, n_steps=3, trials=200,
+                          use_exact=False, seed=1, parallel=parallel)
+
+
+def test_simulate_seeded_reproducible():
+    sim_a = RobotSimulator(rng=random.Random(7))
+    sim_b = RobotSimulator(rng=random.Random(7))
+    # same seed should give identical empirical distributions
+    assert sim_a.simulate(4, trials=20000) == sim_b.simulate(4, trials=20000)
+
+
+@pytest.mark.parametrize("have_numba, method", SIMULATE_VARIANTS)
+def test_simulate_variants_close_to_exact(monkeypatch, have_numba, method):
+    if have_numba is not None:
+        monkeypatch.setattr(robot_sim, "HAVE_NUMBA", have_numba)
+    sim = RobotSimulator(rng=random.Random(5))
+    probs = getattr(sim, method)(4, trials=20000)
+    assert abs(sum(probs.values()) - 1.0) < 1e-9
+    exact = sim.compute_exact_posterior(4)
+    for pos in range(sim.max_pos+1):
+        assert abs(probs[pos] - exact[pos]) < 0.02
+
+
+class _RandomOnlyRng:
+    # minimal rng exposing nothing but .random(), like np.random.Generator
+    def __init__(self, seed):
+        self._rng = random.Random(seed)
+
+    def random(self):
+        return self._rng.random()
+
+
+@pytest.mark.parametrize("have_numba, method", SIMULATE_VARIANTS)
+def test_simulate_accepts_random_only_rng(monkeypatch, have_numba, method):
+    if have_numba is not None:
+        monkeypatch.setattr(robot_sim, "HAVE_NUMBA", have_numba)
+    probs = getattr(RobotSimulator(rng=_RandomOnlyRng(0)), method)(3, trials=100)
+    assert abs(sum(probs.values()) - 1.0) < 1e-9
+    # the same seed reproduces the same run
+    assert probs == getattr(RobotSimulator(rng=_RandomOnlyRng(0)), method)(3, trials=100)
+
+
+class _CountingRng(_RandomOnlyRng):
+    # counts how many uniforms have been drawn
+    def __init__(self, seed):
+        super().__init__(seed)
+        self.calls = 0
+
+    def random(self):
+        self.calls += 1
+        return super().random()
+
+
+def test_fast_path_stops_drawing_after_absorption():
+    rng = _CountingRng(0)
+    # always move 2: reaches max_pos=3 on the second step
+    sim = RobotSimulator(move_probs={2: 1.0}, rng=rng)
+    assert sim.run_single(50) == 3
+    assert rng.calls == 2
+
+
+def test_trace_path_runs_every_step_after_absorption():
+    sim = RobotSimulator(move_probs={2: 1.0}, rng=random.Random(0))
+    pos, trace = sim.run_single(50, return_trace=True)
+    assert pos == 3
+    assert len(trace) == 50
+    assert [t[0] for t in trace] == [2] + [3] * 49
+
+
+@pytest.mark.parametrize("have_numba, method", SIMULATE_VARIANTS)
+def test_simulate_variants_absorb_at_max_pos(monkeypatch, have_numba, method):
+    if have_numba is not None:
+        monkeypatch.setattr(robot_sim, "HAVE_NUMBA", have_numba)
+    sim = RobotSimulator(move_probs={0: 0.5, 2: 0.5}, rng=random.Random(1))
+    # one step is not enough to absorb, and the early exit must not cut it short
+    probs = getattr(sim, method)(1, trials=2000)
+    assert probs[3] == 0.0 and abs(probs[0] + probs[2] - 1.0) < 1e-9
+    # with many steps every trial ends (and stays) at max_pos
+    assert getattr(sim, method)(60, trials=2000) == {0: 0.0, 1: 0.0, 2: 0.0, 3: 1.0}
+
+
+def test_alias_table_reproduces_move_probs():
+    for cfg in movement_table.distribution_sets:
+        sim = RobotSimulator(move_probs=cfg["movement"])
+        k = len(sim._moves)
+        # each column contributes prob[i]/k to its own move and the rest to its alias
+        mass = [0.0] * k
+        for i in range(k):
+            mass[i] += sim._alias_prob[i] / k
+            mass[sim._alias_alias[i]] += (1.0 - sim._alias_prob[i]) / k
+        for i, m in enumerate(sim._moves):
+            assert abs(mass[i] - cfg["movement"][m]) < 1e-12
+
+
+@pytest.mark.parametrize("move_probs", [
+    {1: 0.5, 2: 0.3},              # does not sum to 1
+    {0: 1.2, 1: -0.2},             # negative probability
+    {0: float("nan"), 1: 1.0},     # NaN probability
+    {-1: 0.5, 1: 0.5},             # negative move distance
+])
+def test_invalid_move_probs_rejected(monkeypatch, move_probs):
+    with pytest.raises(ValueError):
+        RobotSimulator(move_probs=move_probs)
+    # the batched exact solver (and so compare_distributions with use_exact)
+    # never builds a RobotSimulator, so it must validate on its own
+    valid = movement_table.distribution_sets[0]["movement"]
+    with pytest.raises(ValueError):
+        RobotSimulator.compute_exact_posterior_batch([valid, move_probs], 3)
+    monkeypatch.setattr(plt, "show", lambda: None)
+    with pytest.raises(ValueError):
+        compare_distributions([{"movement": move_probs}], 3, use_exact=True)
+
+
+def test_labels_are_ints_and_trace_uses_names():
+    assert [RobotSimulator.true_label_at(p) for p in range(4)] == [WINDOW, WALL, WINDOW, WALL]
+    # perfect sensors always report the true label
+    sim = RobotSimulator(rng=random.Random(0))
+    assert sim.perceive_label(WALL) == WALL
+    assert sim.perceive_label(WINDOW) == WINDOW
+    _, trace = sim.run_single(4, return_trace=True)
+    for target, true, perceived in trace:
+        assert true == ("window", "wall")[target % 2]
+        assert perceived == true
+
+
+def test_compute_exact_posterior_is_memoized():
+    robot_sim._exact_dp.cache_clear()
+    # dict insertion order must not matter for the cache key
+    a = RobotSimulator(move_probs={0: 0.2, 1: 0.7, 2: 0.1}).compute_exact_posterior(5)
+    b = RobotSimulator(move_probs={2: 0.1, 1: 0.7, 0: 0.2}).compute_exact_posterior(5)
+    assert a == b
+    info = robot_sim._exact_dp.cache_info()
+    assert info.misses == 1 and info.hits == 1
+
+
+def test_compute_exact_posterior_batch_matches_single():
+    movements = [cfg["movement"] for cfg in movement_table.distribution_sets]
+    for n_steps in (0, 1, 5, 12):
+        batch = RobotSimulator.compute_exact_posterior_batch(movements, n_steps)
+        assert batch.shape == (len(movements), 4)
+        for row, move_probs in zip(batch, movements):
+            single = RobotSimulator(move_probs=move_probs).compute_exact_posterior(n_steps)
+            for pos in range(4):
+                assert abs(row[pos] - single[pos]) < 1e-12
+
+
+def test_compute_exact_posterior_rejects_negative_steps():
+    with pytest.raises(ValueError):
+        RobotSimulator().compute_exact_posterior(-1)
+
+
+def test_compute_exact_posterior_batch_rejects_negative_steps():
+    movements = [cfg["movement"] for cfg in movement_table.distribution_sets]
+    with pytest.raises(ValueError):
+        RobotSimulator.compute_exact_posterior_batch(movements, -1)